@@ -0,0 +1,84 @@
+from bisect import bisect_right
+
+__all__ = ['NCList']
+
+
+class _Level(object):
+    __slots__ = ('starts', 'ends', 'items', 'children')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.items = []
+        self.children = []
+
+    def append(self, start, end, item):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.items.append(item)
+        self.children.append(None)
+
+
+class NCList(object):
+    __slots__ = ('_root',)
+
+    def __init__(self, intervals):
+        self._root = _Level()
+        stack = [(float('inf'), self._root, None)]
+
+        for start, end, item in sorted(
+            intervals, key=lambda interval: (interval[0], -interval[1])
+        ):
+            while stack[-1][0] < end:
+                stack.pop()
+
+            _, level, index = stack[-1]
+
+            if index is not None:
+                if level.children[index] is None:
+                    level.children[index] = _Level()
+                level = level.children[index]
+
+            level.append(start, end, item)
+            stack.append((end, level, len(level.items) - 1))
+
+    def overlapping(self, start, end):
+        """Return items overlapping the half-open region ``[start, end)``.
+
+        >>> nclist = NCList([
+        ...     (0, 100, 'outer'),
+        ...     (10, 20, 'nested'),
+        ...     (10, 20, 'duplicate'),
+        ...     (50, 150, 'sibling'),
+        ...     (200, 300, 'distant')])
+        >>> nclist.overlapping(15, 16)
+        ['outer', 'nested', 'duplicate']
+        >>> nclist.overlapping(90, 210)
+        ['outer', 'sibling', 'distant']
+        >>> nclist.overlapping(100, 150)
+        ['sibling']
+        >>> nclist.overlapping(20, 20)
+        []
+        >>> nclist.overlapping(60, 10)
+        []
+
+        """
+        if start >= end:
+            return []
+
+        levels = [self._root]
+        hits = []
+
+        while levels:
+            level = levels.pop()
+            i = bisect_right(level.ends, start)
+
+            while i < len(level.starts) and level.starts[i] < end:
+                hits.append((level.starts[i], level.ends[i], level.items[i]))
+
+                if level.children[i] is not None:
+                    levels.append(level.children[i])
+                i += 1
+
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        return [item for _, _, item in hits]
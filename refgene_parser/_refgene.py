@@ -1,10 +1,16 @@
-import csv
 import gzip
-import io
+import os
+import pickle
 import re
+import sys
 
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from ._nclist import NCList
+
 __all__ = [
     'Interval',
     'Exon',
@@ -12,8 +18,27 @@ __all__ = [
     'RefGene'
 ]
 
+_REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+_CACHE_VERSION = 1
+
+_FIELD_NAMES = {}
+
+
+def _field_names(cls):
+    if cls not in _FIELD_NAMES:
+        _FIELD_NAMES[cls] = frozenset(
+            slot
+            for klass in cls.__mro__
+            for slot in getattr(klass, '__slots__', ())
+            if not slot.startswith('_'))
+    return _FIELD_NAMES[cls]
+
 
 class Interval(object):
+    __slots__ = (
+        'chrom', 'start', 'end', 'strand', 'name', 'score', 'metadata')
+
     def __init__(
         self,
         chrom,
@@ -21,63 +46,103 @@ class Interval(object):
         end,
         strand='.',
         name=None,
+        score=None,
+        validate=True,
         **metadata
     ):
-        assert isinstance(start, int), 'Loci must be integers'
-        assert isinstance(end, int), 'Loci must be integers'
-        assert end - start > 0, 'Exclusive end must be greater than start'
-        assert strand in ('.', '+', '-'), 'Strand must be ".", "+", "-" only'
-
-        self.chrom = str(chrom)
+        if validate:
+            assert isinstance(start, int), 'Loci must be integers'
+            assert isinstance(end, int), 'Loci must be integers'
+            assert end - start > 0, 'Exclusive end must be greater than start'
+            assert strand in ('.', '+', '-'), (
+                'Strand must be ".", "+", "-" only')
+
+        self.chrom = sys.intern(str(chrom))
         self.start = start
         self.end = end
         self.strand = strand
         self.name = name
+        self.score = score
         self.metadata = metadata
 
     @property
     def sam_interval(self):
         return f'{self.chrom}:{self.start}-{self.end}'
 
+    def write_bed(self, out):
+        r"""Write this interval as one six-column BED record to ``out``.
+
+        >>> import io
+        >>> out = io.BytesIO()
+        >>> gene = Gene('chr1', 100, 500, '-', name='Kras', score='7')
+        >>> gene.write_bed(out)
+        >>> Exon('chr1', 100, 200, '-', rank=2).write_bed(out)
+        >>> print(out.getvalue().decode().replace('\t', ' '), end='')
+        chr1 100 500 Kras 7 -
+        chr1 100 200 . 0 -
+
+        """
+        out.write(b'%s\t%d\t%d\t%s\t%d\t%s\n' % (
+            self.chrom.encode(),
+            self.start,
+            self.end,
+            (self.name or '.').encode(),
+            int(self.score or 0),
+            self.strand.encode()))
+
     def get(self, item, default=None):
-        temp = self.__dict__.copy()
-        temp.update(self.metadata)
-        return temp.get(item, default)
+        """Return a data attribute or metadata value, attributes first.
+
+        >>> interval = Interval('chr1', 0, 10, '+', source='refGene')
+        >>> interval['source'], interval['strand'], interval['sam_interval']
+        ('refGene', '+', None)
+        >>> interval.metadata['start'] = -1
+        >>> interval['start']
+        0
+        >>> class Annotated(Interval):
+        ...     pass
+        >>> annotated = Annotated('chr1', 0, 10)
+        >>> annotated.gc = 0.5
+        >>> annotated['gc'], annotated.get(0, 'missing')
+        (0.5, 'missing')
+
+        """
+        if item in _field_names(type(self)):
+            return getattr(self, item, default)
+
+        instance_dict = getattr(self, '__dict__', None)
+
+        if instance_dict is not None and item in instance_dict:
+            return instance_dict[item]
+        return self.metadata.get(item, default)
 
     def __getitem__(self, item):
-        temp = self.__dict__.copy()
-        temp.update(self.metadata)
-        return temp.get(item, None)
+        return self.get(item)
 
     def __len__(self):
         return self.end - self.start
 
     def __eq__(self, other):
-        return all((
-            self.chrom == other.chrom,
-            self.start == other.start,
-            self.end == other.end,
-            self.strand == other.strand))
+        return (
+            self.chrom == other.chrom and
+            self.start == other.start and
+            self.end == other.end and
+            self.strand == other.strand)
+
+    def __hash__(self):
+        return hash((self.chrom, self.start, self.end, self.strand))
 
     def __lt__(self, other):
-        return all((
-            self.chrom == other.chrom,
-            self.start < other.start))
+        return self.chrom == other.chrom and self.start < other.start
 
     def __le__(self, other):
-        return all((
-            self.chrom == other.chrom,
-            self.start <= other.start))
+        return self.chrom == other.chrom and self.start <= other.start
 
     def __gt__(self, other):
-        return all((
-            self.chrom == other.chrom,
-            self.end > other.end))
+        return self.chrom == other.chrom and self.end > other.end
 
     def __ge__(self, other):
-        return all((
-            self.chrom == other.chrom,
-            self.end >= other.end))
+        return self.chrom == other.chrom and self.end >= other.end
 
     def __repr__(self):
         return (
@@ -92,6 +157,8 @@ class Interval(object):
 
 
 class Exon(Interval):
+    __slots__ = ('rank', 'frame_offset')
+
     def __init__(
         self,
         chrom,
@@ -101,6 +168,7 @@ class Exon(Interval):
         rank=None,
         frame_offset=-1,
         name=None,
+        validate=True,
         **metadata
     ):
         super().__init__(
@@ -109,18 +177,20 @@ class Exon(Interval):
             end,
             strand=strand,
             name=name,
+            validate=validate,
             metadata=metadata)
 
-        if (
-            frame_offset is not None and
-            not (isinstance(frame_offset, int) and
-                 frame_offset in range(-1, 3))
-        ):
-            raise ValueError(
-                'Frame offset must be None or integer and in set [-1, 2]')
+        if validate:
+            if (
+                frame_offset is not None and
+                not (isinstance(frame_offset, int) and
+                     -1 <= frame_offset <= 2)
+            ):
+                raise ValueError(
+                    'Frame offset must be None or integer and in set [-1, 2]')
 
-        if not isinstance(rank, int) and rank > 0:
-            raise ValueError('Rank must be a positive integer!')
+            if not isinstance(rank, int) and rank > 0:
+                raise ValueError('Rank must be a positive integer!')
 
         self.rank = rank
         self.frame_offset = None if frame_offset == -1 else frame_offset
@@ -145,6 +215,20 @@ class Exon(Interval):
 
 
 class Gene(Interval):
+    __slots__ = (
+        'id',
+        'transcript_start',
+        'transcript_stop',
+        'coding_start',
+        'coding_end',
+        'coding_start_status',
+        'coding_end_status',
+        '_exon_starts',
+        '_exon_ends',
+        '_exon_frames',
+        '_exon_ranks',
+        '_sorted_exons')
+
     def __init__(
         self,
         chrom,
@@ -158,6 +242,7 @@ class Gene(Interval):
         score=None,
         coding_start_status=None,
         coding_end_status=None,
+        validate=True,
         **metadata
     ):
         super().__init__(
@@ -166,6 +251,8 @@ class Gene(Interval):
             end,
             strand=strand,
             name=name,
+            score=score,
+            validate=validate,
             metadata=metadata)
 
         self.id = id
@@ -176,19 +263,89 @@ class Gene(Interval):
         self.coding_start_status = coding_start_status
         self.coding_end_status = coding_end_status
 
-        self._exons = []
+        self._exon_starts = array('l')
+        self._exon_ends = array('l')
+        self._exon_frames = array('l')
+        self._exon_ranks = array('l')
+        self._sorted_exons = None
+
+    def add_exon(self, exon):
+        self._exon_starts.append(exon.start)
+        self._exon_ends.append(exon.end)
+        self._exon_frames.append(
+            -1 if exon.frame_offset is None else exon.frame_offset)
+        self._exon_ranks.append(0 if exon.rank is None else exon.rank)
+        self._sorted_exons = None
+
+    def _extend_exons(self, starts, ends, frames, ranks):
+        self._exon_starts.extend(starts)
+        self._exon_ends.extend(ends)
+        self._exon_frames.extend(frames)
+        self._exon_ranks.extend(ranks)
+        self._sorted_exons = None
+
+    def __getstate__(self):
+        return (
+            self.chrom,
+            self.start,
+            self.end,
+            self.strand,
+            self.name,
+            self.metadata,
+            self.id,
+            self.coding_start,
+            self.coding_end,
+            self.coding_start_status,
+            self.coding_end_status,
+            self.score,
+            self._exon_starts.tobytes(),
+            self._exon_ends.tobytes(),
+            self._exon_frames.tobytes(),
+            self._exon_ranks.tobytes())
+
+    def __setstate__(self, state):
+        (self.chrom, self.start, self.end, self.strand, self.name,
+         self.metadata, self.id, self.coding_start, self.coding_end,
+         self.coding_start_status, self.coding_end_status, self.score,
+         exon_starts, exon_ends, exon_frames, exon_ranks) = state
+
+        self.chrom = sys.intern(self.chrom)
+
+        self.transcript_start = self.start
+        self.transcript_stop = self.end
+
+        self._exon_starts = array('l')
+        self._exon_starts.frombytes(exon_starts)
+        self._exon_ends = array('l')
+        self._exon_ends.frombytes(exon_ends)
+        self._exon_frames = array('l')
+        self._exon_frames.frombytes(exon_frames)
+        self._exon_ranks = array('l')
+        self._exon_ranks.frombytes(exon_ranks)
+        self._sorted_exons = None
 
     @property
     def num_exons(self):
-        return len(self.exons)
+        return len(self._exon_starts)
 
     @property
     def exons(self):
-        return self._exons
-
-    @exons.getter
-    def exons(self):
-        return sorted(self._exons)
+        if self._sorted_exons is None:
+            self._sorted_exons = tuple(sorted(
+                Exon(
+                    self.chrom,
+                    start,
+                    end,
+                    self.strand,
+                    rank or None,
+                    frame_offset,
+                    validate=False)
+                for start, end, frame_offset, rank in zip(
+                    self._exon_starts,
+                    self._exon_ends,
+                    self._exon_frames,
+                    self._exon_ranks)))
+        return self._sorted_exons
 
     def __repr__(self):
         return (
@@ -202,10 +359,20 @@ class Gene(Interval):
 
 
 class RefGene(object):
-    def __init__(self, path):
+    chunk_size = 10_000_000
+    batch_size = 1000
+
+    def __init__(self, path, workers=1, cache=False):
         self.path = Path(path)
+        self.workers = workers
+        self.cache = cache
         assert self.path.exists(), f'File does not exist {self.path}'
 
+        self._genes = None
+        self._id_index = None
+        self._name_index = None
+        self._overlap_index = None
+
     @staticmethod
     def _line_to_gene(line):
         (_, name, chrom, strand, transcript_start, transcript_stop,
@@ -222,70 +389,223 @@ class RefGene(object):
             id=name,
             coding_start=int(coding_start),
             coding_end=int(coding_end),
-            score=score,
+            score=int(score),
             coding_start_status=coding_start_status,
-            coding_end_status=coding_end_status)
-
-        exon_starts = exon_starts.split(',')
-        exon_ends = exon_ends.split(',')
-        exon_frames = exon_frames.split(',')
+            coding_end_status=coding_end_status,
+            validate=False)
 
         if strand == '-':
             exon_ranks = range(int(num_exons), 0, -1)
         else:
             exon_ranks = range(1, int(num_exons) + 1)
 
-        for start, end, frame_offset, rank in zip(
-            exon_starts, exon_ends, exon_frames, exon_ranks
-        ):
-            if any(_ == '' for _ in (start, end, frame_offset)):
-                continue
+        gene._extend_exons(
+            *_triple_split_ints(exon_starts, exon_ends, exon_frames),
+            exon_ranks)
+
+        return gene
 
-            exon = Exon(
-                chrom=chrom,
-                start=int(start),
-                end=int(end),
-                strand=strand,
-                rank=rank,
-                frame_offset=int(frame_offset))
+    def load(self):
+        if self._genes is None:
+            self._genes = list(self.iter_genes())
+        return self._genes
 
-            gene._exons.append(exon)
+    def _genes_or_stream(self):
+        return self.iter_genes() if self._genes is None else self._genes
 
-        return gene
+    def _build_indices(self):
+        self._id_index = {}
+        self._name_index = {}
+
+        for gene in self.load():
+            self._id_index.setdefault(gene.id, gene)
+            self._name_index.setdefault(gene.name, gene)
 
     def gene_by_id(self, id):
-        for gene in self:
-            if gene.id == id:
-                return gene
+        if self._id_index is None:
+            self._build_indices()
+        return self._id_index.get(id)
 
-    def genes_by_id_pattern(self, id, flags=re.IGNORECASE):
-        pattern = re.compile(id, flags)
+    def _genes_by_pattern(self, field, pattern, flags):
+        if flags & ~re.IGNORECASE or not _REGEX_METACHARACTERS.isdisjoint(
+            pattern
+        ):
+            regex = re.compile(pattern, flags)
 
-        for gene in self:
-            if pattern.match(gene.id):
-                yield gene
+            for gene in self._genes_or_stream():
+                if regex.match(getattr(gene, field)):
+                    yield gene
+
+        elif flags & re.IGNORECASE:
+            prefix = pattern.lower()
+
+            for gene in self._genes_or_stream():
+                if getattr(gene, field).lower().startswith(prefix):
+                    yield gene
+
+        else:
+            for gene in self._genes_or_stream():
+                if getattr(gene, field).startswith(pattern):
+                    yield gene
+
+    def genes_by_id_pattern(self, id, flags=re.IGNORECASE):
+        yield from self._genes_by_pattern('id', id, flags)
 
     def gene_by_name(self, name):
-        for gene in self:
-            if gene.name == name:
-                return gene
+        if self._name_index is None:
+            self._build_indices()
+        return self._name_index.get(name)
 
     def genes_by_name_pattern(self, name, flags=re.IGNORECASE):
-        pattern = re.compile(name, flags)
+        yield from self._genes_by_pattern('name', name, flags)
+
+    def _build_overlap_index(self):
+        intervals = defaultdict(list)
+
+        for gene in self.load():
+            intervals[gene.chrom].append((gene.start, gene.end, gene))
+
+        self._overlap_index = {
+            chrom: NCList(chrom_intervals)
+            for chrom, chrom_intervals in intervals.items()}
+
+    def overlapping(self, chrom, start, end):
+        if self._overlap_index is None:
+            self._build_overlap_index()
+
+        if chrom not in self._overlap_index:
+            return []
+        return self._overlap_index[chrom].overlapping(start, end)
+
+    def _open(self):
+        with open(self.path, 'rb') as handle:
+            magic = handle.read(2)
+
+        if magic == b'\x1f\x8b':
+            return gzip.open(self.path, 'rb')
+        return open(self.path, 'rb', buffering=1 << 20)
+
+    def _iter_line_chunks(self):
+        with self._open() as handle:
+            buffer = bytearray()
+
+            while True:
+                chunk = handle.read(self.chunk_size)
+
+                if not chunk:
+                    break
 
-        for gene in self:
-            if pattern.match(gene.name):
-                yield gene
+                buffer.extend(chunk)
+                boundary = buffer.rfind(b'\n') + 1
+
+                if boundary == 0:
+                    continue
+
+                text = buffer[:boundary].decode('utf-8')
+                del buffer[:boundary]
+
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n')
+
+                yield [line for line in text.split('\n') if line]
+
+            if buffer:
+                yield [buffer.decode('utf-8').rstrip('\r')]
+
+    @property
+    def cache_path(self):
+        return self.path.with_name(self.path.name + '.cache.pkl')
+
+    def iter_genes(self):
+        if not self.cache:
+            yield from self._parse_genes()
+            return
+
+        genes = self._read_cache()
+
+        if genes is None:
+            genes = list(self._parse_genes())
+            self._write_cache(genes)
+
+        yield from genes
+
+    def _read_cache(self):
+        cache_path = self.cache_path
+
+        try:
+            if cache_path.stat().st_mtime < self.path.stat().st_mtime:
+                return None
+
+            with open(cache_path, 'rb') as handle:
+                payload = pickle.load(handle)
+        except (
+            OSError,
+            pickle.UnpicklingError,
+            EOFError,
+            ValueError,
+            TypeError,
+            AttributeError,
+        ):
+            return None
+
+        if (
+            not isinstance(payload, tuple) or
+            len(payload) != 2 or
+            payload[0] != _CACHE_VERSION
+        ):
+            return None
+        return payload[1]
+
+    def _write_cache(self, genes):
+        cache_path = self.cache_path
+        partial_path = cache_path.with_name(cache_path.name + '.partial')
+
+        try:
+            with open(partial_path, 'wb') as handle:
+                pickle.dump(
+                    (_CACHE_VERSION, genes),
+                    handle,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial_path, cache_path)
+        except (OSError, pickle.PicklingError):
+            try:
+                partial_path.unlink()
+            except OSError:
+                pass
+
+    def _parse_genes(self):
+        if self.workers == 1:
+            for lines in self._iter_line_chunks():
+                for line in lines:
+                    yield self._line_to_gene(line.split('\t'))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for lines in self._iter_line_chunks():
+                batches = (
+                    lines[i:i + self.batch_size]
+                    for i in range(0, len(lines), self.batch_size))
+
+                for genes in executor.map(_parse_batch, batches, chunksize=4):
+                    yield from genes
 
     def __iter__(self):
-        handle = gzip.open(self.path, 'rb')
-        self._reader = csv.reader(
-            io.TextIOWrapper(handle),
-            delimiter='\t')
+        self._iterator = self.iter_genes()
         return self
 
     def __next__(self):
-        return self._line_to_gene(next(self._reader))
+        return next(self._iterator)
 
     def __repr__(self):
         return f'RefSeq("{self.path}")'
+
+
+def _triple_split_ints(a, b, c):
+    return (
+        map(int, filter(None, a.split(','))),
+        map(int, filter(None, b.split(','))),
+        map(int, filter(None, c.split(','))))
+
+
+def _parse_batch(lines):
+    return [RefGene._line_to_gene(line.split('\t')) for line in lines]
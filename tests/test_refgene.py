@@ -0,0 +1,113 @@
+import gzip
+import re
+
+import pytest
+
+from refgene_parser import RefGene
+
+RECORDS = [
+    ('585', 'NM_021284', 'chr6', '-', '145216698', '145250231', '145219940',
+     '145246771', '5', '145216698,145225908,145232989,145246622,145250101,',
+     '145220031,145226087,145233150,145246773,145250231,', '0', 'Kras',
+     'cmpl', 'cmpl', '2,2,0,0,-1,'),
+    ('592', 'NM_010937', 'chr3', '+', '103058284', '103067914', '103058549',
+     '103066947', '3', '103058284,103064085,103066843,',
+     '103058657,103064264,103067914,', '0', 'Nras', 'cmpl', 'cmpl',
+     '0,0,2,'),
+    ('592', 'NR_003559', 'chr6', '+', '145230000', '145240000', '145240000',
+     '145240000', '2', '145230000,145238000,', '145231000,145240000,', '0',
+     'Mrpl48', 'unk', 'unk', '-1,-1,'),
+    ('592', 'NM_181548', 'chrX', '-', '7924275', '7928607', '7924500',
+     '7928300', '1', '7924275,', '7928607,', '0', 'Eras', 'cmpl', 'cmpl',
+     '0,'),
+]
+
+
+def summary(genes):
+    return [
+        (repr(gene), gene.coding_start, gene.coding_end, gene.score,
+         [repr(exon) for exon in gene.exons])
+        for gene in genes]
+
+
+@pytest.fixture
+def text(tmp_path):
+    path = tmp_path / 'refGene.txt'
+    path.write_text(''.join('\t'.join(record) + '\n' for record in RECORDS))
+    return path
+
+
+@pytest.fixture
+def gzipped(tmp_path, text):
+    path = tmp_path / 'refGene.txt.gz'
+    with gzip.open(path, 'wb') as handle:
+        handle.write(text.read_bytes())
+    return path
+
+
+def test_plain_crlf_and_gzip_parse_the_same(tmp_path, text, gzipped):
+    crlf = tmp_path / 'crlf.txt'
+    crlf.write_bytes(text.read_bytes().replace(b'\n', b'\r\n'))
+
+    expected = summary(RefGene(gzipped))
+    assert len(expected) == len(RECORDS)
+    assert summary(RefGene(text)) == expected
+    assert summary(RefGene(crlf)) == expected
+
+
+def test_exons_are_ranked_by_strand(text):
+    kras = RefGene(text).gene_by_name('Kras')
+    assert [exon.rank for exon in kras.exons] == [5, 4, 3, 2, 1]
+    assert [exon.frame_offset for exon in kras.exons] == [2, 2, 0, 0, None]
+
+
+def test_pooled_parsing_matches_serial(text):
+    refgene = RefGene(text, workers=2)
+    refgene.batch_size = 1
+    assert summary(refgene) == summary(RefGene(text))
+
+
+def test_cache_round_trip(text):
+    refgene = RefGene(text, cache=True)
+    parsed = summary(refgene)
+    assert refgene.cache_path.exists()
+    assert summary(RefGene(text, cache=True)) == parsed
+
+    refgene.cache_path.write_bytes(b'not a pickle')
+    assert summary(RefGene(text, cache=True)) == parsed
+
+
+def test_load_shares_genes_with_indices(text):
+    refgene = RefGene(text)
+    kras = refgene.gene_by_id('NM_021284')
+    assert refgene.load()[0] is kras
+    assert refgene.overlapping('chr6', 145233000, 145233100)[0] is kras
+
+
+@pytest.mark.parametrize('literal, pattern', [
+    ('nm_', '^nm_'),
+    ('NR_0035', 'NR_0035.*'),
+    ('zzz', 'z{3}'),
+])
+def test_literal_and_regex_id_queries_agree(text, literal, pattern):
+    refgene = RefGene(text)
+    assert (
+        summary(refgene.genes_by_id_pattern(literal)) ==
+        summary(refgene.genes_by_id_pattern(pattern)))
+
+
+def test_literal_name_queries_honour_flags(text):
+    refgene = RefGene(text)
+    assert [g.name for g in refgene.genes_by_name_pattern('kr')] == ['Kras']
+    assert list(refgene.genes_by_name_pattern('kr', flags=0)) == []
+    assert (
+        [g.name for g in refgene.genes_by_name_pattern('Kr', flags=0)] ==
+        [g.name for g in refgene.genes_by_name_pattern('Kr', re.IGNORECASE)])
+
+
+def test_overlapping_nested_and_empty_regions(text):
+    refgene = RefGene(text)
+    hits = refgene.overlapping('chr6', 145230500, 145231500)
+    assert [gene.name for gene in hits] == ['Kras', 'Mrpl48']
+    assert refgene.overlapping('chr6', 145230500, 145230500) == []
+    assert refgene.overlapping('chr1', 0, 10 ** 9) == []